@@ -11,23 +11,53 @@ import sys
 import json
 import argparse
 import hashlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 import pydicom
 from pydicom.errors import InvalidDicomError
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian
 
 # Optional GPU acceleration
 try:
     import cupy as cp
     HAS_CUPY = True
-    print("✓ CuPy detected - GPU acceleration available")
 except ImportError:
     HAS_CUPY = False
-    print("⚠  CuPy not available - smoothing will be skipped or use CPU (slow)")
 
+# Optional CPU fallback for smoothing
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# Optional faster JSON writer
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Tags needed to validate, sort and size slices during the header-only scan
+HEADER_TAGS = [
+    'InstanceNumber',
+    'SliceLocation',
+    'ImagePositionPatient',
+    'RescaleSlope',
+    'RescaleIntercept',
+    'Rows',
+    'Columns',
+    'PixelData',
+]
 
-def anonymize_identifier(identifier: str, salt: str = "medical_volume_renderer") -> str:
+# Default anonymization salt, pre-hashed once so each call only hashes the identifier
+DEFAULT_SALT = "medical_volume_renderer"
+_SALTED_SHA256 = hashlib.sha256(f"{DEFAULT_SALT}:".encode('utf-8'))
+
+
+def anonymize_identifier(identifier: str, salt: str = DEFAULT_SALT) -> str:
     """
     Anonymize an identifier using SHA256 hashing.
     
@@ -41,58 +71,179 @@ def anonymize_identifier(identifier: str, salt: str = "medical_volume_renderer")
     if not identifier:
         return "UNKNOWN"
     
-    # Create hash
-    hash_input = f"{salt}:{identifier}".encode('utf-8')
-    hash_result = hashlib.sha256(hash_input).hexdigest()
+    # Create hash (resume from the pre-hashed salt when possible)
+    if salt == DEFAULT_SALT:
+        hasher = _SALTED_SHA256.copy()
+    else:
+        hasher = hashlib.sha256(f"{salt}:".encode('utf-8'))
+    hasher.update(identifier.encode('utf-8'))
+    hash_result = hasher.hexdigest()
     
     # Return first 16 characters for readability
     return hash_result[:16].upper()
 
 
-def read_dicom_files(input_dir: Path) -> List[pydicom.FileDataset]:
+def _is_dicom(file_path: Path) -> bool:
+    """
+    Check for the "DICM" magic bytes that follow the 128-byte preamble.
+    
+    Args:
+        file_path: Path to the candidate file
+        
+    Returns:
+        True if the file is a DICOM Part 10 file
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(128)
+            return f.read(4) == b'DICM'
+    except OSError:
+        return False
+
+
+def _read_dicom_header(file_path: Path) -> Tuple[Optional[pydicom.Dataset], str]:
+    """
+    Read the HEADER_TAGS of a single file (runs in a worker process).
+    
+    Args:
+        file_path: Path to the candidate DICOM file
+        
+    Returns:
+        (header dataset, "") on success, or (None, status line) if skipped
+    """
+    # Only files with the DICOM magic bytes are handed to pydicom
+    if not _is_dicom(file_path):
+        return None, f"  ✗ Skipped (not DICOM): {file_path.name}"
+    
+    try:
+        # Deferring large values lets PixelData be detected by its tag alone,
+        # without reading or decoding the pixels
+        ds = pydicom.dcmread(str(file_path), defer_size=1024,
+                             specific_tags=HEADER_TAGS, force=True)
+        # Verify it has pixel data
+        if 'PixelData' in ds and 'Rows' in ds and 'Columns' in ds:
+            del ds.PixelData
+            return ds, ""
+        return None, f"  ⚠  Skipped (no pixel data): {file_path.name}"
+    except InvalidDicomError:
+        return None, f"  ✗ Skipped (invalid DICOM): {file_path.name}"
+    except Exception as e:
+        return None, f"  ✗ Error reading {file_path.name}: {e}"
+
+
+def _read_pixels(ds: pydicom.Dataset) -> np.ndarray:
     """
-    Read all DICOM files from the input directory.
+    Get the stored pixel values of a single-frame slice.
+    
+    Uncompressed little-endian 16-bit data (the common CT case) is viewed in
+    place with np.frombuffer; anything else goes through ds.pixel_array.
+    
+    Args:
+        ds: Dataset read with its pixel data
+        
+    Returns:
+        2D array of stored values (read-only when viewed in place)
+    """
+    transfer_syntax = getattr(getattr(ds, 'file_meta', None), 'TransferSyntaxUID', None)
+    if (transfer_syntax in (ExplicitVRLittleEndian, ImplicitVRLittleEndian)
+            and ds.get('BitsAllocated') == 16
+            and ds.get('SamplesPerPixel', 1) == 1
+            and int(ds.get('NumberOfFrames') or 1) == 1):
+        rows, cols = int(ds.Rows), int(ds.Columns)
+        bits_stored = int(ds.get('BitsStored') or 16)
+        if ds.get('PixelRepresentation', 0) == 1:
+            pixels = np.frombuffer(ds.PixelData, dtype='<i2', count=rows * cols)
+            low, high = -(1 << (bits_stored - 1)), (1 << (bits_stored - 1)) - 1
+        else:
+            pixels = np.frombuffer(ds.PixelData, dtype='<u2', count=rows * cols)
+            low, high = 0, (1 << bits_stored) - 1
+        # pydicom masks/sign-extends to BitsStored; the raw view only matches
+        # when every value already fits in that range
+        if bits_stored == 16 or (pixels.min() >= low and pixels.max() <= high):
+            return pixels.reshape(rows, cols)
+    return ds.pixel_array
+
+
+def _load_slice(args: Tuple[int, Path]) -> Tuple[int, Optional[np.ndarray], str]:
+    """
+    Decode the pixels of a single slice (runs in a worker process).
+    
+    The raw stored values are returned, not HU; the rescale is applied by the
+    caller directly into the volume.
+    
+    Args:
+        args: (slice index, file path)
+        
+    Returns:
+        (slice index, stored pixel values, "") on success, or
+        (slice index, None, status line) if the pixels can't be decoded
+    """
+    i, file_path = args
+    try:
+        ds = pydicom.dcmread(str(file_path), force=True)
+        return i, _read_pixels(ds), ""
+    except Exception as e:
+        return i, None, f"  ✗ Error reading {file_path.name}: {e}"
+
+
+def _write_slice(output_file: Path, data: np.ndarray) -> None:
+    """
+    Write one slice as raw float16 (runs on a writer thread).
+    
+    The cast is done per slice, so no float16 copy of the whole volume is
+    allocated; slices that are already float16 are written as-is.
+    
+    Args:
+        output_file: Destination .raw file
+        data: 2D slice (float32 or float16)
+    """
+    with open(output_file, 'wb') as f:
+        data.astype(np.float16, copy=False).tofile(f)
+
+
+def read_dicom_files(input_dir: Path, executor: Executor) -> List[Tuple[Path, pydicom.Dataset]]:
+    """
+    Read the headers of all DICOM files from the input directory.
+    
+    Files without the "DICM" magic bytes (DICOM Part 10) are skipped unparsed.
+    Only the tags in HEADER_TAGS are parsed and pixel data is only checked for
+    presence; pixels are loaded later, once per slice, by convert_dicom_series.
     
     Args:
         input_dir: Path to directory containing DICOM files
+        executor: Worker pool the headers are read on
         
     Returns:
-        List of DICOM datasets
+        List of (file path, header dataset) tuples
     """
     dicom_files = []
     
     print(f"Scanning directory: {input_dir}")
     
-    for file_path in input_dir.rglob("*"):
-        if file_path.is_file():
-            try:
-                ds = pydicom.dcmread(str(file_path), force=True)
-                # Verify it has pixel data
-                if hasattr(ds, 'pixel_array'):
-                    dicom_files.append(ds)
-                    print(f"  ✓ Loaded: {file_path.name}")
-                else:
-                    print(f"  ⚠  Skipped (no pixel data): {file_path.name}")
-            except InvalidDicomError:
-                print(f"  ✗ Skipped (invalid DICOM): {file_path.name}")
-            except Exception as e:
-                print(f"  ✗ Error reading {file_path.name}: {e}")
+    file_paths = [p for p in input_dir.rglob("*") if p.is_file()]
+    for file_path, (ds, status) in zip(file_paths, executor.map(_read_dicom_header, file_paths, chunksize=32)):
+        if ds is not None:
+            dicom_files.append((file_path, ds))
+            print(f"  ✓ Loaded: {file_path.name}")
+        else:
+            print(status)
     
     print(f"\nFound {len(dicom_files)} valid DICOM files")
     return dicom_files
 
 
-def sort_dicom_slices(dicom_files: List[pydicom.FileDataset]) -> List[pydicom.FileDataset]:
+def sort_dicom_slices(dicom_files: List[Tuple[Path, pydicom.Dataset]]) -> List[Tuple[Path, pydicom.Dataset]]:
     """
     Sort DICOM slices by Instance Number or Slice Location.
     
     Args:
-        dicom_files: List of unsorted DICOM datasets
+        dicom_files: List of unsorted (file path, header dataset) tuples
         
     Returns:
-        Sorted list of DICOM datasets
+        Sorted list of (file path, header dataset) tuples
     """
-    def get_sort_key(ds):
+    def get_sort_key(item):
+        _, ds = item
         # Try different sorting methods in order of preference
         if hasattr(ds, 'InstanceNumber') and ds.InstanceNumber is not None:
             return float(ds.InstanceNumber)
@@ -109,12 +260,13 @@ def sort_dicom_slices(dicom_files: List[pydicom.FileDataset]) -> List[pydicom.Fi
     return sorted_files
 
 
-def extract_metadata(dicom_files: List[pydicom.FileDataset], global_min: float, global_max: float, anonymize: bool = True) -> Dict[str, Any]:
+def extract_metadata(first_ds: pydicom.Dataset, num_slices: int, global_min: float, global_max: float, anonymize: bool = True) -> Dict[str, Any]:
     """
     Extract relevant metadata from DICOM series.
     
     Args:
-        dicom_files: List of DICOM datasets
+        first_ds: Full header (pixel data not needed) of the first slice
+        num_slices: Number of slices in the series
         global_min: Minimum HU value across all slices
         global_max: Maximum HU value across all slices
         anonymize: Whether to anonymize patient identifiers
@@ -122,12 +274,9 @@ def extract_metadata(dicom_files: List[pydicom.FileDataset], global_min: float,
     Returns:
         Dictionary containing series metadata
     """
-    if not dicom_files:
+    if num_slices == 0:
         return {}
     
-    # Use first file for series-level metadata
-    first_ds = dicom_files[0]
-    
     # Helper function to safely get DICOM tag value
     def safe_get(ds, attr, default=""):
         try:
@@ -136,14 +285,14 @@ def extract_metadata(dicom_files: List[pydicom.FileDataset], global_min: float,
             if isinstance(val, bytes):
                 return val.decode('utf-8', errors='replace')
             elif isinstance(val, pydicom.multival.MultiValue):
+                # Numeric VRs (DS, IS, ...) become JSON numbers
+                if all(isinstance(v, (int, float)) for v in val):
+                    return [float(v) for v in val]
                 return [str(v) for v in val]
             return str(val) if val != default else default
         except:
             return default
     
-    # Get pixel array shape from first slice
-    pixel_array = first_ds.pixel_array
-    
     # Get original identifiers
     patient_name = safe_get(first_ds, 'PatientName')
     patient_id = safe_get(first_ds, 'PatientID')
@@ -161,9 +310,9 @@ def extract_metadata(dicom_files: List[pydicom.FileDataset], global_min: float,
         series_uid = f"SERIES_{anonymize_identifier(series_uid_str[:min(len(series_uid_str), 64)])}"
     
     metadata = {
-        "numSlices": len(dicom_files),
-        "width": int(pixel_array.shape[1]),
-        "height": int(pixel_array.shape[0]),
+        "numSlices": num_slices,
+        "width": int(first_ds.Columns),
+        "height": int(first_ds.Rows),
         "format": "float16",
         "bytesPerVoxel": 2,
         "anonymized": anonymize,
@@ -208,8 +357,87 @@ def extract_metadata(dicom_files: List[pydicom.FileDataset], global_min: float,
     return metadata
 
 
+# Threads per block along each axis for the Perona-Malik kernel
+PERONA_MALIK_BLOCK = 8
+
+# One Perona-Malik iteration fused into a single kernel. Each block stages its
+# voxels plus a one-voxel halo in shared memory, so every voxel is read from
+# global memory about once instead of 7 times; indices are clamped at the
+# borders (edge padding) and no intermediate volumes are materialized.
+# The volume is stored as float16 (the output format anyway) to halve memory
+# traffic and footprint; all arithmetic is done in float32.
+_PERONA_MALIK_SRC = r"""
+#include <cuda_fp16.h>
+
+#define TILE (BLOCK_SIZE + 2)
+#define VOXEL(z, y, x) __half2float(in[(size_t)(z) * plane + (size_t)(y) * W + (x)])
+
+// inv_K2 = 1 / K^2, precomputed on the host
+__device__ __forceinline__ float conductance(float d, float inv_K2, int diffusion_type)
+{
+    float g2 = d * d;
+    if (diffusion_type == 1)
+        return __expf(-g2 * inv_K2);                      // Exponential: favors high-contrast edges
+    return __frcp_rn(__fmaf_rn(g2, inv_K2, 1.0f));        // Rational: favors wide regions
+}
+
+extern "C" __global__
+void perona_malik_step(const __half* in, __half* out, int D, int H, int W,
+                       float inv_K2, float lambda_param, int diffusion_type)
+{
+    __shared__ float tile[TILE][TILE][TILE];
+
+    int tx = threadIdx.x, ty = threadIdx.y, tz = threadIdx.z;
+    int x = blockIdx.x * BLOCK_SIZE + tx;
+    int y = blockIdx.y * BLOCK_SIZE + ty;
+    int z = blockIdx.z * BLOCK_SIZE + tz;
+    size_t plane = (size_t)H * W;
+
+    // Threads past the volume edge still fill their slot with the clamped
+    // edge voxel, which is the halo their in-range neighbors need
+    int cx = min(x, W - 1), cy = min(y, H - 1), cz = min(z, D - 1);
+    tile[tz + 1][ty + 1][tx + 1] = VOXEL(cz, cy, cx);
+    if (tx == 0)              tile[tz + 1][ty + 1][0]        = VOXEL(cz, cy, max(cx - 1, 0));
+    if (tx == BLOCK_SIZE - 1) tile[tz + 1][ty + 1][TILE - 1] = VOXEL(cz, cy, min(cx + 1, W - 1));
+    if (ty == 0)              tile[tz + 1][0][tx + 1]        = VOXEL(cz, max(cy - 1, 0), cx);
+    if (ty == BLOCK_SIZE - 1) tile[tz + 1][TILE - 1][tx + 1] = VOXEL(cz, min(cy + 1, H - 1), cx);
+    if (tz == 0)              tile[0][ty + 1][tx + 1]        = VOXEL(max(cz - 1, 0), cy, cx);
+    if (tz == BLOCK_SIZE - 1) tile[TILE - 1][ty + 1][tx + 1] = VOXEL(min(cz + 1, D - 1), cy, cx);
+    __syncthreads();
+
+    if (x >= W || y >= H || z >= D)
+        return;
+
+    float center = tile[tz + 1][ty + 1][tx + 1];
+    float north = tile[tz][ty + 1][tx + 1];
+    float south = tile[tz + 2][ty + 1][tx + 1];
+    float west = tile[tz + 1][ty][tx + 1];
+    float east = tile[tz + 1][ty + 2][tx + 1];
+    float up = tile[tz + 1][ty + 1][tx];
+    float down = tile[tz + 1][ty + 1][tx + 2];
+
+    float divergence = 0.0f;
+    float d;
+    d = north - center; divergence += conductance(d, inv_K2, diffusion_type) * d;
+    d = south - center; divergence += conductance(d, inv_K2, diffusion_type) * d;
+    d = west - center;  divergence += conductance(d, inv_K2, diffusion_type) * d;
+    d = east - center;  divergence += conductance(d, inv_K2, diffusion_type) * d;
+    d = up - center;    divergence += conductance(d, inv_K2, diffusion_type) * d;
+    d = down - center;  divergence += conductance(d, inv_K2, diffusion_type) * d;
+
+    // Update: I(t+1) = I(t) + lambda * divergence
+    out[(size_t)z * plane + (size_t)y * W + x] = __float2half(center + lambda_param * divergence);
+}
+"""
+
+if HAS_CUPY:
+    _perona_malik_step = cp.RawKernel(_PERONA_MALIK_SRC, 'perona_malik_step',
+                                      options=(f'-DBLOCK_SIZE={PERONA_MALIK_BLOCK}', '-use_fast_math'))
+
+
 def perona_malik_gpu(volume: np.ndarray, iterations: int = 5, K: float = 50.0, 
-                     lambda_param: float = 0.1, diffusion_type: int = 1) -> np.ndarray:
+                     lambda_param: float = 0.1, diffusion_type: int = 1,
+                     return_gpu: bool = False):
     """
     Apply Perona-Malik anisotropic diffusion using GPU acceleration via CuPy.
     
@@ -219,9 +447,10 @@ def perona_malik_gpu(volume: np.ndarray, iterations: int = 5, K: float = 50.0,
         K: Edge threshold parameter (in HU units, default 50.0 for CT data)
         lambda_param: Time step (stability requires lambda <= 0.25 for 3D)
         diffusion_type: 1 (exponential) or 2 (rational)
+        return_gpu: Return the cupy array left on the device instead of copying it back
         
     Returns:
-        Smoothed volume as numpy array in HU values
+        Smoothed float16 volume as numpy array (or cupy array if return_gpu) in HU values
     """
     if not HAS_CUPY:
         print("⚠  CuPy not available - returning unsmoothed volume")
@@ -229,76 +458,244 @@ def perona_malik_gpu(volume: np.ndarray, iterations: int = 5, K: float = 50.0,
     
     print(f"Applying Perona-Malik smoothing on GPU ({iterations} iterations)...")
     
-    # Transfer to GPU
-    vol_gpu = cp.asarray(volume, dtype=cp.float32)
-    output_gpu = cp.zeros_like(vol_gpu)
-    
-    for iteration in range(iterations):
-        # Compute gradients using neighbor differences
-        # Pad for boundary handling
-        padded = cp.pad(vol_gpu, 1, mode='edge')
+    # Transfer to GPU (float16 storage, float32 arithmetic in the kernel)
+    vol_gpu = cp.ascontiguousarray(cp.asarray(volume, dtype=cp.float16))
+    output_gpu = cp.empty_like(vol_gpu)
+    
+    depth, height, width = vol_gpu.shape
+    block = (PERONA_MALIK_BLOCK, PERONA_MALIK_BLOCK, PERONA_MALIK_BLOCK)
+    grid = tuple((n + PERONA_MALIK_BLOCK - 1) // PERONA_MALIK_BLOCK for n in (width, height, depth))
+    
+    def step(src, dst):
+        # One fused launch: 6-neighbor stencil, diffusion coefficients and update
+        _perona_malik_step(grid, block, (src, dst,
+                                         np.int32(depth), np.int32(height), np.int32(width),
+                                         np.float32(1.0 / (K * K)), np.float32(lambda_param),
+                                         np.int32(diffusion_type)))
+    
+    # Iterations are replayed from a CUDA graph holding two ping-pong steps
+    # (vol -> output -> vol), so each pair costs one launch. The stream is a
+    # blocking one so it stays ordered with work on the default stream.
+    stream = cp.cuda.Stream()
+    pairs, odd = divmod(iterations, 2)
+    with stream:
+        if pairs:
+            _perona_malik_step.compile()
+            stream.begin_capture()
+            step(vol_gpu, output_gpu)
+            step(output_gpu, vol_gpu)
+            graph = stream.end_capture()
+            
+            for pair in range(pairs):
+                graph.launch(stream)
+                print(f"  Iteration {2 * pair + 1}/{iterations} complete")
+                print(f"  Iteration {2 * pair + 2}/{iterations} complete")
         
-        # Extract neighbors (6-connected)
-        north = padded[:-2, 1:-1, 1:-1]
-        south = padded[2:, 1:-1, 1:-1]
-        west = padded[1:-1, :-2, 1:-1]
-        east = padded[1:-1, 2:, 1:-1]
-        up = padded[1:-1, 1:-1, :-2]
-        down = padded[1:-1, 1:-1, 2:]
-        center = vol_gpu
-        
-        # Compute gradient magnitudes
-        grad_n = cp.abs(north - center)
-        grad_s = cp.abs(south - center)
-        grad_w = cp.abs(west - center)
-        grad_e = cp.abs(east - center)
-        grad_u = cp.abs(up - center)
-        grad_d = cp.abs(down - center)
+        if odd:
+            step(vol_gpu, output_gpu)
+            # Swap buffers so vol_gpu holds the result
+            vol_gpu, output_gpu = output_gpu, vol_gpu
+            print(f"  Iteration {iterations}/{iterations} complete")
+    
+    print("✓ Smoothing complete")
+    
+    if return_gpu:
+        return vol_gpu
+    
+    # Transfer back to CPU
+    return cp.asnumpy(vol_gpu)
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _perona_malik_step_cpu(vol, out, inv_K2, lambda_param, diffusion_type):
+        # Same stencil as the CUDA kernel, slices spread across cores
+        depth, height, width = vol.shape
+        for z in prange(depth):
+            zn = max(z - 1, 0)
+            zs = min(z + 1, depth - 1)
+            for y in range(height):
+                yw = max(y - 1, 0)
+                ye = min(y + 1, height - 1)
+                for x in range(width):
+                    xu = max(x - 1, 0)
+                    xd = min(x + 1, width - 1)
+                    center = vol[z, y, x]
+                    divergence = np.float32(0.0)
+                    for neighbor in (vol[zn, y, x], vol[zs, y, x], vol[z, yw, x],
+                                     vol[z, ye, x], vol[z, y, xu], vol[z, y, xd]):
+                        d = neighbor - center
+                        if diffusion_type == 1:
+                            c = np.exp(-d * d * inv_K2)
+                        else:
+                            c = np.float32(1.0) / (np.float32(1.0) + d * d * inv_K2)
+                        divergence += c * d
+                    out[z, y, x] = center + lambda_param * divergence
+
+
+def perona_malik_cpu(volume: np.ndarray, iterations: int = 5, K: float = 50.0,
+                     lambda_param: float = 0.1, diffusion_type: int = 1) -> np.ndarray:
+    """
+    Apply Perona-Malik anisotropic diffusion on the CPU via Numba (fallback when CuPy is missing).
+    
+    Args:
+        volume: 3D numpy array in HU values (not normalized)
+        iterations: Number of diffusion iterations
+        K: Edge threshold parameter (in HU units, default 50.0 for CT data)
+        lambda_param: Time step (stability requires lambda <= 0.25 for 3D)
+        diffusion_type: 1 (exponential) or 2 (rational)
         
-        # Compute diffusion coefficients
-        if diffusion_type == 1:
-            # Exponential: favors high-contrast edges
-            c_n = cp.exp(-(grad_n / K) ** 2)
-            c_s = cp.exp(-(grad_s / K) ** 2)
-            c_w = cp.exp(-(grad_w / K) ** 2)
-            c_e = cp.exp(-(grad_e / K) ** 2)
-            c_u = cp.exp(-(grad_u / K) ** 2)
-            c_d = cp.exp(-(grad_d / K) ** 2)
-        else:
-            # Rational: favors wide regions
-            c_n = 1.0 / (1.0 + (grad_n / K) ** 2)
-            c_s = 1.0 / (1.0 + (grad_s / K) ** 2)
-            c_w = 1.0 / (1.0 + (grad_w / K) ** 2)
-            c_e = 1.0 / (1.0 + (grad_e / K) ** 2)
-            c_u = 1.0 / (1.0 + (grad_u / K) ** 2)
-            c_d = 1.0 / (1.0 + (grad_d / K) ** 2)
+    Returns:
+        Smoothed float32 volume as numpy array in HU values
+    """
+    if not HAS_NUMBA:
+        print("⚠  Numba not available - returning unsmoothed volume")
+        return volume
+    
+    print(f"Applying Perona-Malik smoothing on CPU ({iterations} iterations)...")
+    
+    vol = np.ascontiguousarray(volume, dtype=np.float32)
+    output = np.empty_like(vol)
+    inv_K2 = np.float32(1.0 / (K * K))
+    
+    for iteration in range(iterations):
+        _perona_malik_step_cpu(vol, output, inv_K2, np.float32(lambda_param), diffusion_type)
         
-        # Compute divergence of diffusion flux
-        divergence = (
-            c_n * (north - center) +
-            c_s * (south - center) +
-            c_w * (west - center) +
-            c_e * (east - center) +
-            c_u * (up - center) +
-            c_d * (down - center)
-        )
+        # Swap buffers for next iteration
+        vol, output = output, vol
         
-        # Update: I(t+1) = I(t) + lambda * divergence
-        output_gpu[:] = center + lambda_param * divergence
+        print(f"  Iteration {iteration + 1}/{iterations} complete")
+    
+    print("✓ Smoothing complete")
+    return vol
+
+
+def _copy_to_host_async(vol_gpu: "cp.ndarray") -> Tuple[np.ndarray, "cp.cuda.Stream"]:
+    """
+    Start copying a device volume into pinned host memory on a side stream.
+    
+    The copy is ordered after the work already queued on the current stream
+    and overlaps whatever is queued next; synchronize the returned stream
+    before reading the host array.
+    
+    Args:
+        vol_gpu: Contiguous cupy array to copy
         
-        # Swap buffers for next iteration
-        vol_gpu, output_gpu = output_gpu, vol_gpu
+    Returns:
+        (host array backed by pinned memory, stream the copy runs on)
+    """
+    pinned = cp.cuda.alloc_pinned_memory(vol_gpu.nbytes)
+    host = np.frombuffer(pinned, dtype=vol_gpu.dtype, count=vol_gpu.size).reshape(vol_gpu.shape)
+    
+    copy_stream = cp.cuda.Stream(non_blocking=True)
+    copy_stream.wait_event(cp.cuda.get_current_stream().record())
+    vol_gpu.data.copy_to_host_async(host.ctypes.data, vol_gpu.nbytes, stream=copy_stream)
+    
+    return host, copy_stream
+
+
+def _chunk_grid(shape: Tuple[int, int, int], chunk_size: int) -> Tuple[int, int, int]:
+    """
+    Compute and report the chunk grid covering a volume.
+    
+    Args:
+        shape: Volume shape (Z, Y, X)
+        chunk_size: Size of each cubic chunk
         
-        if (iteration + 1) % 1 == 0:
-            print(f"  Iteration {iteration + 1}/{iterations} complete")
+    Returns:
+        Number of chunks along (Z, Y, X)
+    """
+    depth, height, width = shape
     
-    # Transfer back to CPU
-    result = cp.asnumpy(vol_gpu)
+    # Round up to next multiple of chunk_size
+    num_chunks_z = (depth + chunk_size - 1) // chunk_size
+    num_chunks_y = (height + chunk_size - 1) // chunk_size
+    num_chunks_x = (width + chunk_size - 1) // chunk_size
     
-    print("✓ Smoothing complete")
+    print(f"\nComputing chunk min/max values...")
+    print(f"  Chunk size: {chunk_size}³")
+    print(f"  Volume size: {width}×{height}×{depth}")
+    print(f"  Padded size: {num_chunks_x * chunk_size}×{num_chunks_y * chunk_size}×{num_chunks_z * chunk_size}")
+    print(f"  Number of chunks: {num_chunks_x}×{num_chunks_y}×{num_chunks_z} = {num_chunks_x * num_chunks_y * num_chunks_z}")
+    
+    return num_chunks_z, num_chunks_y, num_chunks_x
+
+
+def _reduce_chunks(volume, chunk_size: int, xp, reduce, combine):
+    """
+    Reduce every chunk_size³ chunk of a volume without building a padded copy.
+    
+    Axes are reduced one at a time, Z first, so the only full-volume pass is a
+    reshape view over whole Z chunks; later axes work on data already shrunk
+    by chunk_size. Voxels past the volume edge count as zeros, exactly like
+    the zero padding this replaces.
+    
+    Args:
+        volume: 3D numpy or cupy array (Z, Y, X)
+        chunk_size: Size of each cubic chunk
+        xp: Array module of volume (numpy or cupy)
+        reduce: Chunk reduction, xp.min or xp.max
+        combine: Matching elementwise op, xp.minimum or xp.maximum
+        
+    Returns:
+        Array of shape (num_chunks_z, num_chunks_y, num_chunks_x)
+    """
+    result = volume
+    for axis in range(3):
+        moved = xp.moveaxis(result, axis, 0)
+        length = moved.shape[0]
+        full = (length // chunk_size) * chunk_size
+        parts = []
+        if full > 0:
+            whole = moved[:full].reshape((full // chunk_size, chunk_size) + moved.shape[1:])
+            parts.append(reduce(whole, axis=1))
+        if full < length:
+            # Partial chunk: reduce what exists, then fold in the padding zeros
+            partial = reduce(moved[full:], axis=0, keepdims=True)
+            parts.append(combine(partial, 0))
+        result = xp.moveaxis(xp.concatenate(parts, axis=0), 0, axis)
     return result
 
 
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _chunk_minmax_cpu(volume, chunk_size, chunk_minmax):
+        # One Z slab of chunks per task; rows are scanned contiguously and
+        # min/max are accumulated in the same pass
+        depth, height, width = volume.shape
+        num_chunks_z, num_chunks_y, num_chunks_x, _ = chunk_minmax.shape
+        for iz in prange(num_chunks_z):
+            z_start = iz * chunk_size
+            z_end = min(z_start + chunk_size, depth)
+            lo = np.full((num_chunks_y, num_chunks_x), np.inf, dtype=np.float32)
+            hi = np.full((num_chunks_y, num_chunks_x), -np.inf, dtype=np.float32)
+            for z in range(z_start, z_end):
+                for y in range(height):
+                    iy = y // chunk_size
+                    for ix in range(num_chunks_x):
+                        x_start = ix * chunk_size
+                        x_end = min(x_start + chunk_size, width)
+                        chunk_lo = lo[iy, ix]
+                        chunk_hi = hi[iy, ix]
+                        for x in range(x_start, x_end):
+                            v = volume[z, y, x]
+                            if v < chunk_lo:
+                                chunk_lo = v
+                            if v > chunk_hi:
+                                chunk_hi = v
+                        lo[iy, ix] = chunk_lo
+                        hi[iy, ix] = chunk_hi
+            for iy in range(num_chunks_y):
+                for ix in range(num_chunks_x):
+                    # Chunks reaching past the volume edge include zero padding
+                    if (z_end - z_start < chunk_size or (iy + 1) * chunk_size > height
+                            or (ix + 1) * chunk_size > width):
+                        lo[iy, ix] = min(lo[iy, ix], np.float32(0.0))
+                        hi[iy, ix] = max(hi[iy, ix], np.float32(0.0))
+                    chunk_minmax[iz, iy, ix, 0] = lo[iy, ix]
+                    chunk_minmax[iz, iy, ix, 1] = hi[iy, ix]
+
+
 def compute_chunk_minmax(volume: np.ndarray, chunk_size: int) -> np.ndarray:
     """
     Compute min/max values for each chunk in the volume.
@@ -311,57 +708,43 @@ def compute_chunk_minmax(volume: np.ndarray, chunk_size: int) -> np.ndarray:
         Numpy array of shape (num_chunks_z, num_chunks_y, num_chunks_x, 2)
         where [:, :, :, 0] is min and [:, :, :, 1] is max
     """
-    depth, height, width = volume.shape
+    num_chunks = _chunk_grid(volume.shape, chunk_size)
     
-    # Round up to next multiple of chunk_size
-    padded_depth = ((depth + chunk_size - 1) // chunk_size) * chunk_size
-    padded_height = ((height + chunk_size - 1) // chunk_size) * chunk_size
-    padded_width = ((width + chunk_size - 1) // chunk_size) * chunk_size
+    if HAS_NUMBA and volume.dtype == np.float32:
+        # Single pass computing min and max together
+        chunk_minmax = np.empty(num_chunks + (2,), dtype=np.float32)
+        _chunk_minmax_cpu(np.ascontiguousarray(volume), chunk_size, chunk_minmax)
+    else:
+        chunk_min = _reduce_chunks(volume, chunk_size, np, np.min, np.minimum)
+        chunk_max = _reduce_chunks(volume, chunk_size, np, np.max, np.maximum)
+        chunk_minmax = np.stack([chunk_min, chunk_max], axis=-1).astype(np.float32)
     
-    # Pad volume if necessary
-    if padded_depth > depth or padded_height > height or padded_width > width:
-        padded_volume = np.zeros((padded_depth, padded_height, padded_width), dtype=volume.dtype)
-        padded_volume[:depth, :height, :width] = volume
-        volume = padded_volume
+    print(f"✓ Chunk min/max computation complete")
     
-    num_chunks_z = padded_depth // chunk_size
-    num_chunks_y = padded_height // chunk_size
-    num_chunks_x = padded_width // chunk_size
+    return chunk_minmax
+
+
+def compute_chunk_minmax_gpu(vol_gpu: "cp.ndarray", chunk_size: int) -> np.ndarray:
+    """
+    GPU version of compute_chunk_minmax for a volume already resident on the device.
     
-    print(f"\nComputing chunk min/max values...")
-    print(f"  Chunk size: {chunk_size}³")
-    print(f"  Volume size: {width}×{height}×{depth}")
-    print(f"  Padded size: {padded_width}×{padded_height}×{padded_depth}")
-    print(f"  Number of chunks: {num_chunks_x}×{num_chunks_y}×{num_chunks_z} = {num_chunks_x * num_chunks_y * num_chunks_z}")
+    Only the small per-chunk result is copied back to the host.
     
-    # Allocate result array
-    chunk_minmax = np.zeros((num_chunks_z, num_chunks_y, num_chunks_x, 2), dtype=np.float32)
-    
-    total_chunks = num_chunks_x * num_chunks_y * num_chunks_z
-    processed = 0
-    
-    # Compute min/max for each chunk
-    for iz in range(num_chunks_z):
-        for iy in range(num_chunks_y):
-            for ix in range(num_chunks_x):
-                z_start = iz * chunk_size
-                y_start = iy * chunk_size
-                x_start = ix * chunk_size
-                
-                z_end = z_start + chunk_size
-                y_end = y_start + chunk_size
-                x_end = x_start + chunk_size
-                
-                chunk = volume[z_start:z_end, y_start:y_end, x_start:x_end]
-                
-                chunk_minmax[iz, iy, ix, 0] = np.min(chunk)
-                chunk_minmax[iz, iy, ix, 1] = np.max(chunk)
-                
-                processed += 1
-                if processed % 100 == 0 or processed == total_chunks:
-                    print(f"  Processed {processed}/{total_chunks} chunks", end='\r')
-    
-    print(f"\n✓ Chunk min/max computation complete")
+    Args:
+        vol_gpu: 3D cupy array (Z, Y, X)
+        chunk_size: Size of each cubic chunk (must be power of 2)
+        
+    Returns:
+        Numpy array of shape (num_chunks_z, num_chunks_y, num_chunks_x, 2)
+        where [:, :, :, 0] is min and [:, :, :, 1] is max
+    """
+    _chunk_grid(vol_gpu.shape, chunk_size)
+    
+    chunk_min = _reduce_chunks(vol_gpu, chunk_size, cp, cp.min, cp.minimum)
+    chunk_max = _reduce_chunks(vol_gpu, chunk_size, cp, cp.max, cp.maximum)
+    chunk_minmax = cp.asnumpy(cp.stack([chunk_min, chunk_max], axis=-1)).astype(np.float32)
+    
+    print(f"✓ Chunk min/max computation complete")
     
     return chunk_minmax
 
@@ -388,67 +771,90 @@ def convert_dicom_series(input_dir: Path, output_dir: Path, apply_smoothing: boo
     # Create output directory
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Read and sort DICOM files
-    dicom_files = read_dicom_files(input_dir)
-    if not dicom_files:
-        print("✗ No valid DICOM files found!")
-        return
-    
-    sorted_files = sort_dicom_slices(dicom_files)
-    
-    # First pass - find GLOBAL min/max and load volume
-    print("\nLoading volume into memory...")
-    first_ds = sorted_files[0]
-    height, width = first_ds.pixel_array.shape
-    num_slices = len(sorted_files)
-    
-    # Allocate full volume
-    volume = np.zeros((num_slices, height, width), dtype=np.float32)
-    global_min = float('inf')
-    global_max = float('-inf')
-    
-    for i, ds in enumerate(sorted_files):
-        rescale_slope = float(getattr(ds, 'RescaleSlope', 1.0))
-        rescale_intercept = float(getattr(ds, 'RescaleIntercept', 0.0))
-        pixel_array = ds.pixel_array
-        data = pixel_array.astype(np.float32) * rescale_slope + rescale_intercept
+    # Headers and pixels are decoded in parallel; one pool serves both passes
+    with ProcessPoolExecutor() as executor:
+        # Read and sort DICOM files
+        dicom_files = read_dicom_files(input_dir, executor)
+        if not dicom_files:
+            print("✗ No valid DICOM files found!")
+            return
         
-        slice_min = np.min(data)
-        slice_max = np.max(data)
+        sorted_files = sort_dicom_slices(dicom_files)
         
-        global_min = min(global_min, slice_min)
-        global_max = max(global_max, slice_max)
+        # First pass - load volume
+        print("\nLoading volume into memory...")
+        _, first_header = sorted_files[0]
+        height, width = int(first_header.Rows), int(first_header.Columns)
+        num_slices = len(sorted_files)
         
-        volume[i] = data
+        # Allocate full volume
+        volume = np.empty((num_slices, height, width), dtype=np.float32)
         
-        if (i + 1) % 50 == 0 or i == num_slices - 1:
-            print(f"  Loaded {i + 1}/{num_slices} slices")
+        # Slices that fail to decode are skipped; the rest are packed in order
+        decoded_files = []
+        slice_jobs = [(i, file_path) for i, (file_path, _) in enumerate(sorted_files)]
+        for done, (i, pixel_array, status) in enumerate(executor.map(_load_slice, slice_jobs, chunksize=8)):
+            if pixel_array is None:
+                print(status)
+                continue
+            
+            _, header = sorted_files[i]
+            rescale_slope = np.float32(float(getattr(header, 'RescaleSlope', 1.0)))
+            rescale_intercept = np.float32(float(getattr(header, 'RescaleIntercept', 0.0)))
+            
+            # Rescale straight into the volume, no temporary slice
+            out_slice = volume[len(decoded_files)]
+            np.multiply(pixel_array, rescale_slope, out=out_slice, dtype=np.float32)
+            out_slice += rescale_intercept
+            decoded_files.append(sorted_files[i])
+            
+            if (done + 1) % 50 == 0 or done == num_slices - 1:
+                print(f"  Loaded {len(decoded_files)}/{num_slices} slices")
+    
+    if not decoded_files:
+        print("✗ No decodable DICOM slices found!")
+        return
+    
+    sorted_files = decoded_files
+    num_slices = len(sorted_files)
+    volume = volume[:num_slices]
     
+    # Find GLOBAL min/max over the whole volume at once
+    global_min = float(volume.min())
+    global_max = float(volume.max())
     print(f"  Global HU range: [{global_min:.1f}, {global_max:.1f}]")
     
     # Keep HU values as-is (no normalization)
     print("\nKeeping original HU values (no normalization)...")
     
-    # Apply smoothing if requested
+    # Apply smoothing if requested, then compute chunk min/max
+    # (after smoothing so it reflects actual rendered values)
     if apply_smoothing and HAS_CUPY:
-        volume = perona_malik_gpu(volume, iterations=smoothing_iterations, 
-                                  K=50.0, lambda_param=0.1, diffusion_type=2)
-    elif apply_smoothing and not HAS_CUPY:
-        print("⚠  Smoothing requested but CuPy not available - saving unsmoothed volume")
-    
-    # Compute chunk min/max (after smoothing so it reflects actual rendered values)
-    chunk_minmax = compute_chunk_minmax(volume, chunk_size)
-    
-    # Convert to float16 and save slices
+        vol_gpu = perona_malik_gpu(volume, iterations=smoothing_iterations, 
+                                   K=50.0, lambda_param=0.1, diffusion_type=2,
+                                   return_gpu=True)
+        # Reduce on the device while the smoothed volume is copied back
+        volume, copy_stream = _copy_to_host_async(vol_gpu)
+        chunk_minmax = compute_chunk_minmax_gpu(vol_gpu, chunk_size)
+        copy_stream.synchronize()
+        del vol_gpu
+    else:
+        if apply_smoothing and HAS_NUMBA:
+            volume = perona_malik_cpu(volume, iterations=smoothing_iterations,
+                                      K=50.0, lambda_param=0.1, diffusion_type=2)
+        elif apply_smoothing:
+            print("⚠  Smoothing requested but neither CuPy nor Numba available - saving unsmoothed volume")
+        chunk_minmax = compute_chunk_minmax(volume, chunk_size)
+    
+    # Convert to float16 and save slices (cast fused into each slice write)
     print(f"\nSaving {num_slices} slices as float16...")
-    volume_f16 = volume.astype(np.float16)
     
-    for i in range(num_slices):
-        output_file = output_dir / f"slice_{i:04d}.raw"
-        volume_f16[i].tofile(str(output_file))
-        
-        if (i + 1) % 50 == 0 or i == num_slices - 1:
-            print(f"  Saved {i + 1}/{num_slices} slices")
+    # The viewer fetches one file per slice; overlap the writes on threads
+    output_files = [output_dir / f"slice_{i:04d}.raw" for i in range(num_slices)]
+    with ThreadPoolExecutor() as writer:
+        for i, _ in enumerate(writer.map(_write_slice, output_files, volume)):
+            if (i + 1) % 50 == 0 or i == num_slices - 1:
+                print(f"  Saved {i + 1}/{num_slices} slices")
     
     # Save chunk min/max data as binary file
     chunk_file = output_dir / "chunk_minmax.bin"
@@ -458,7 +864,9 @@ def convert_dicom_series(input_dir: Path, output_dir: Path, apply_smoothing: boo
     
     # Extract and save metadata
     print("\nExtracting metadata...")
-    metadata = extract_metadata(sorted_files, global_min, global_max, anonymize)
+    first_path, _ = sorted_files[0]
+    first_ds = pydicom.dcmread(str(first_path), stop_before_pixels=True, force=True)
+    metadata = extract_metadata(first_ds, num_slices, global_min, global_max, anonymize)
     
     # Add chunk information to metadata
     metadata["chunkSize"] = chunk_size
@@ -470,8 +878,12 @@ def convert_dicom_series(input_dir: Path, output_dir: Path, apply_smoothing: boo
     metadata_file = output_dir / "metadata.json"
     print(f"Saving metadata to: {metadata_file}")
     
-    with open(metadata_file, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    if HAS_ORJSON:
+        with open(metadata_file, 'wb') as f:
+            f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(metadata_file, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
     
     print("\n✅ Conversion complete!")
     print(f"   Output directory: {output_dir}")
@@ -483,13 +895,21 @@ def convert_dicom_series(input_dir: Path, output_dir: Path, apply_smoothing: boo
     print(f"   Total chunks: {metadata['numChunksX']}×{metadata['numChunksY']}×{metadata['numChunksZ']} = {metadata['totalChunks']}")
     print(f"   HU range: [{metadata['huMin']:.1f}, {metadata['huMax']:.1f}]")
     print(f"   Anonymization: {'Enabled' if anonymize else 'Disabled'}")
-    if apply_smoothing and HAS_CUPY:
+    if apply_smoothing and (HAS_CUPY or HAS_NUMBA):
         print(f"   Smoothing: Applied ({smoothing_iterations} iterations)")
     else:
         print(f"   Smoothing: Skipped")
     
 
 def main():
+    # Reported here rather than at import so spawned workers stay quiet
+    if HAS_CUPY:
+        print("✓ CuPy detected - GPU acceleration available")
+    else:
+        print("⚠  CuPy not available - smoothing will be skipped or use CPU (slow)")
+    if HAS_NUMBA:
+        print("✓ Numba detected - CPU smoothing available")
+    
     parser = argparse.ArgumentParser(
         description='Convert DICOM series to float16 raw buffers for WebGPU',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -40,6 +40,22 @@ Write-Host ""
 Write-Host "Core dependencies installed" -ForegroundColor Green
 Write-Host ""
 
+# Try to install Numba for the CPU smoothing fallback
+Write-Host "Installing numba (CPU smoothing fallback, optional)..." -ForegroundColor Cyan
+python -m pip install --upgrade numba
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "Numba installation failed - CPU smoothing fallback disabled" -ForegroundColor Yellow
+}
+Write-Host ""
+
+# Try to install orjson for faster metadata writing
+Write-Host "Installing orjson (faster metadata JSON, optional)..." -ForegroundColor Cyan
+python -m pip install --upgrade orjson
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "orjson installation failed - the standard json module will be used" -ForegroundColor Yellow
+}
+Write-Host ""
+
 # Try to install CuPy for GPU acceleration
 Write-Host "========================================" -ForegroundColor Cyan
 Write-Host "GPU Acceleration Setup (Optional)" -ForegroundColor Cyan
@@ -85,7 +101,7 @@ if ($cudaFound) {
         Write-Host "  GPU acceleration will be available" -ForegroundColor Green
     } else {
         Write-Host "CuPy installation failed" -ForegroundColor Yellow
-        Write-Host "  The converter will work but smoothing will be skipped" -ForegroundColor Yellow
+        Write-Host "  The converter will work but smoothing will run on the CPU (numba) or be skipped" -ForegroundColor Yellow
     }
 } else {
     Write-Host ""
@@ -96,7 +112,7 @@ if ($cudaFound) {
     Write-Host "     https://developer.nvidia.com/cuda-downloads" -ForegroundColor Gray
     Write-Host "  2. Rerun this script" -ForegroundColor Gray
     Write-Host ""
-    Write-Host "The converter will work but Perona-Malik smoothing will be skipped" -ForegroundColor Yellow
+    Write-Host "The converter will work but Perona-Malik smoothing will run on the CPU (numba) or be skipped" -ForegroundColor Yellow
 }
 
 Write-Host ""
@@ -106,6 +122,14 @@ Write-Host "========================================" -ForegroundColor Cyan
 Write-Host "numpy - Installed" -ForegroundColor Green
 Write-Host "pydicom - Installed" -ForegroundColor Green
 
+# Verify Numba installation
+$numbaStatus = python -c "import numba" 2>&1
+if ($LASTEXITCODE -eq 0) {
+    Write-Host "numba - Installed (CPU smoothing fallback enabled)" -ForegroundColor Green
+} else {
+    Write-Host "numba - Not available (CPU smoothing fallback disabled)" -ForegroundColor Yellow
+}
+
 # Verify CuPy installation
 $cupyStatus = python -c "import cupy" 2>&1
 if ($LASTEXITCODE -eq 0) {